@@ -17,11 +17,18 @@
 
 #!/usr/bin/env python3
 
-import sys, os, argparse
+import sys, os, stat, mmap, argparse, contextlib
+
+TEXT_CHUNK_SIZE = 16000
+
+BYTES_PER_ROW = 16
+BINARY_CHUNK_SIZE = 4096 * BYTES_PER_ROW  # Whole rows only, so no row spans two chunks
+
+IDENTIFIER_TABLE = str.maketrans('.-', '__')
 
 def to_identifier(name):
     """Convert filename to valid C identifier"""
-    return name.upper().replace('.', '_').replace('-', '_')
+    return name.upper().translate(IDENTIFIER_TABLE)
 
 def escape_c_string(text):
     """Escape special characters for C string literals"""
@@ -32,25 +39,35 @@ def escape_c_string(text):
     text = text.replace('\t', '\\t')   # Convert tabs
     return text
 
+def map_file(f):
+    """Map an opened binary file read-only, reading it instead when it can't be mapped"""
+    st = os.fstat(f.fileno())
+    if stat.S_ISREG(st.st_mode) and st.st_size > 0:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            pass
+    # Pipes, FIFOs and procfs files report a size of 0 but may still have content
+    return contextlib.nullcontext(f.read())
+
 def write_header_from_file(file_path, out_path, mode='binary', custom_name=None):
     """Convert a file into a C header"""
     if custom_name:
         array_name = to_identifier(custom_name)
         guard = array_name + '_H'
     else:
-        name = os.path.basename(file_path)
-        guard = to_identifier(name) + '_H'
-        array_name = to_identifier(name)
+        array_name = to_identifier(os.path.basename(file_path))
+        guard = array_name + '_H'
 
     if mode == 'text':
+        # Decode the whole input before opening the output, so a bad input leaves it untouched
         with open(file_path, 'r', encoding='utf-8') as f:
             text = f.read()
-        data = text.encode('utf-8')
+        with open_header(out_path, guard) as out:
+            write_text(out, text, array_name)
     else:
-        with open(file_path, 'rb') as f:
-            data = f.read()
-
-    write_data_to_header(data, out_path, guard, array_name, mode)
+        with open(file_path, 'rb') as f, map_file(f) as data:
+            write_data_to_header(data, out_path, guard, array_name, mode)
 
 def write_header_from_string(input_string, array_name, out_path, mode='binary'):
     """Convert a string into a C header"""
@@ -86,9 +103,9 @@ def write_header_from_stdin(array_name, out_path, mode='binary'):
 
     write_data_to_header(data, out_path, guard, array_name, mode)
 
-def write_data_to_header(data, out_path, guard, array_name, mode='binary'):
-    """Write data to C header in text or binary format"""
-
+@contextlib.contextmanager
+def open_header(out_path, guard):
+    """Open a C header for writing, with its include guard and C++ linkage block around the content"""
     with open(out_path, 'w') as f:
         f.write(f"#ifndef {guard}\n")
         f.write(f"#define {guard}\n\n")
@@ -97,10 +114,7 @@ def write_data_to_header(data, out_path, guard, array_name, mode='binary'):
         f.write("extern \"C\" {\n")
         f.write("#endif\n\n")
 
-        if mode == 'text':
-            write_text_array(f, data, array_name)
-        else:
-            write_binary_array(f, data, array_name)
+        yield f
 
         f.write("#ifdef __cplusplus\n")
         f.write("}\n")
@@ -108,7 +122,15 @@ def write_data_to_header(data, out_path, guard, array_name, mode='binary'):
 
         f.write(f"#endif // {guard}\n")
 
-def write_text_array(f, data, array_name, chunk_size=16000):
+def write_data_to_header(data, out_path, guard, array_name, mode='binary'):
+    """Write data to C header in text or binary format"""
+    with open_header(out_path, guard) as f:
+        if mode == 'text':
+            write_text_array(f, data, array_name)
+        else:
+            write_binary_array(f, data, array_name)
+
+def write_text_array(f, data, array_name):
     """Write data as single-line C string literal"""
     try:
         text = data.decode('utf-8')
@@ -116,31 +138,45 @@ def write_text_array(f, data, array_name, chunk_size=16000):
         write_binary_array(f, data, array_name)
         return
 
-    text_size = len(data)
+    write_text(f, text, array_name)
+
+def write_text(f, text, array_name, chunk_size=TEXT_CHUNK_SIZE):
+    """Write decoded text as single-line C string literal, split in pieces of 'chunk_size' characters"""
+    text_size = 0
 
     f.write(f'static const char {array_name}[] =\n')
     for i in range(0, len(text), chunk_size):
-        escaped_chunk = escape_c_string(text[i:i + chunk_size])
-        f.write(f'    "{escaped_chunk}"\n')
+        chunk = text[i:i + chunk_size]
+        # ASCII text is one byte per character, only the rest needs encoding to count its size
+        text_size += len(chunk) if chunk.isascii() else len(chunk.encode('utf-8'))
+        f.write(f'    "{escape_c_string(chunk)}"\n')
     f.write(';\n\n')
     f.write(f"#define {array_name}_SIZE {text_size}\n\n")
 
 def write_binary_array(f, data, array_name):
-    """Write data as binary byte array"""
-    if not data.endswith(b'\0'):
-        data = data + b'\0'
+    """Write data as binary byte array, formatting it in chunks of BINARY_CHUNK_SIZE bytes"""
+    data_size = len(data)
+    if data_size > 0 and data[data_size - 1] == 0:
+        data_size -= 1
+
+    # The array always ends with a null byte, appended if the data doesn't have one
+    array_size = data_size + 1
 
-    data_size = len(data) - 1
+    # Every byte takes 6 characters ("0xNN, "), so rows are cut at fixed offsets
+    row_stride = 6 * BYTES_PER_ROW
 
     f.write(f"static const unsigned char {array_name}[] =\n")
     f.write("{\n")
 
-    for i in range(0, len(data), 16):
-        chunk = data[i:i+16]
+    for i in range(0, array_size, BINARY_CHUNK_SIZE):
+        chunk = data[i:i + BINARY_CHUNK_SIZE]
+        if i + BINARY_CHUNK_SIZE >= array_size and len(data) == data_size:
+            chunk += b'\0'
+        hex_values = "0x" + chunk.hex(' ').upper().replace(' ', ', 0x')
+        rows = [hex_values[j:j + row_stride - 2] for j in range(0, len(hex_values), row_stride)]
         f.write("    ")
-        hex_values = [f"0x{byte:02X}" for byte in chunk]
-        f.write(", ".join(hex_values))
-        if i + 16 < len(data):
+        f.write(",\n    ".join(rows))
+        if i + BINARY_CHUNK_SIZE < array_size:
             f.write(",")
         f.write("\n")
 
@@ -20,6 +20,27 @@
 import sys, re, zlib, struct, argparse
 from pathlib import Path
 
+# === Patterns === #
+
+INCLUDE_PATTERN = re.compile(r'^\s*#include\s+"([^"]+)"', re.MULTILINE)
+
+BLOCK_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+LINE_COMMENT_PATTERN = re.compile(r'//[^\n]*')
+
+SPACES_PATTERN = re.compile(r'[ \t]+')
+
+SYMBOLS = (
+    ',', '.', '(', ')', '{', '}', ';', ':',
+    '+', '-', '*', '/', '=', '<', '>',
+    '!', '?', '|', '&'
+)
+
+SYMBOL_CLASS = '[' + ''.join(map(re.escape, SYMBOLS)) + ']'
+# Both alternatives start with a space so the regex engine can skip ahead to the next one
+SYMBOL_SPACES_PATTERN = re.compile(rf'[ \t](?<={SYMBOL_CLASS}[ \t])[ \t]*|[ \t]+(?={SYMBOL_CLASS})')
+
+FLOAT_LITERAL_PATTERN = re.compile(r'\b(?:(\d+)\.0+(?!\d)|0\.([1-9]\d*)\b)')
+
 # === Processing Passes === #
 
 def process_includes(shader_content, base_path, included_files=None):
@@ -27,8 +48,11 @@ def process_includes(shader_content, base_path, included_files=None):
     if included_files is None:
         included_files = set()
 
+    # Most included files don't include anything themselves
+    if '#include' not in shader_content:
+        return shader_content
+
     base_path = Path(base_path)
-    include_pattern = re.compile(r'^\s*#include\s+"([^"]+)"', re.MULTILINE)
 
     def replacer(match):
         file_path = (base_path / match.group(1)).resolve()
@@ -44,65 +68,55 @@ def process_includes(shader_content, base_path, included_files=None):
         content = file_path.read_text(encoding="utf-8")
         return process_includes(content, file_path.parent, included_files) + "\n"
 
-    return include_pattern.sub(replacer, shader_content)
+    return INCLUDE_PATTERN.sub(replacer, shader_content)
 
 def remove_comments(shader_content):
     """Remove C-style comments"""
-    shader_content = re.sub(r'/\*.*?\*/', '', shader_content, flags=re.DOTALL)
-    shader_content = re.sub(r'//.*?(?=\n|$)', '', shader_content)
+    shader_content = BLOCK_COMMENT_PATTERN.sub('', shader_content)
+    shader_content = LINE_COMMENT_PATTERN.sub('', shader_content)
     return shader_content
 
-def remove_newlines(shader_content):
-    """Remove unnecessary newlines while preserving preprocessor directive spacing"""
-    lines = [line for line in shader_content.splitlines() if line.strip()]
-    if not lines:
-        return ""
-
-    result = []
-    for i, line in enumerate(lines):
-        is_directive = line.lstrip().startswith('#')
-        prev_directive = i > 0 and lines[i-1].lstrip().startswith('#')
-        next_directive = i < len(lines)-1 and lines[i+1].lstrip().startswith('#')
-        if i > 0 and (is_directive or prev_directive or next_directive):
-            result.append("\n")
-        result.append(line)
-
-    return "".join(result)
-
-def normalize_spaces(shader_content):
-    """Remove redundant spaces around operators and symbols, excluding preprocessor directives"""
-    lines = shader_content.split('\n')
-    processed_lines = []
-
-    symbols = [
-        ',', '.', '(', ')', '{', '}', ';', ':',
-        '+', '-', '*', '/', '=', '<', '>',
-        '!', '?', '|', '&'
-    ]
-
-    for line in lines:
-        if line.lstrip().startswith('#'):
-            line = re.sub(r'^\s*#', '#', line)      # Remove spaces before the '#'
-            line = re.sub(r'[ \t]+', ' ', line)     # Replace consecutive spaces to one
-            processed_lines.append(line)
+def normalize_directive(line):
+    """Remove redundant spaces in a preprocessor directive line, expected without leading spaces"""
+    if '\t' not in line and '  ' not in line:
+        return line
+    return SPACES_PATTERN.sub(' ', line)  # Replace consecutive spaces to one
+
+def normalize_code(code):
+    """Remove redundant spaces around operators and symbols"""
+    code = SYMBOL_SPACES_PATTERN.sub('', code)
+    return SPACES_PATTERN.sub(' ', code)
+
+def compact_lines(shader_content):
+    """Remove unnecessary newlines and redundant spaces while keeping preprocessor directives on their own line"""
+    output = []
+    code_lines = []
+
+    for line in shader_content.splitlines():
+        stripped = line.lstrip()
+        if not stripped:
+            continue
+        if stripped[0] == '#':
+            # The code line preceding a directive also stays on its own line
+            if code_lines:
+                last_line = code_lines.pop()
+                if code_lines:
+                    output.append(normalize_code("".join(code_lines)))
+                output.append(normalize_code(last_line))
+                code_lines = []
+            output.append(normalize_directive(stripped))
         else:
-            # Apply normalization to other lines
-            processed_line = line
-            for symbol in symbols:
-                escaped = re.escape(symbol)
-                processed_line = re.sub(rf'[ \t]+{escaped}', symbol, processed_line)
-                processed_line = re.sub(rf'{escaped}[ \t]+', symbol, processed_line)
+            code_lines.append(line)
 
-            processed_line = re.sub(r'[ \t]+', ' ', processed_line)
-            processed_lines.append(processed_line)
+    if code_lines:
+        output.append(normalize_code("".join(code_lines)))
 
-    return '\n'.join(processed_lines)
+    return '\n'.join(output)
 
 def optimize_float_literals(shader_content):
     """Optimize float literal notation"""
-    shader_content = re.sub(r'\b(\d+)\.0+(?!\d)', r'\1.', shader_content)   # 1.000 -> 1.
-    shader_content = re.sub(r'\b0\.([1-9]\d*)\b', r'.\1', shader_content)   # 0.5 -> .5  (but no 0.0 -> .0)
-    return shader_content
+    # 1.000 -> 1. and 0.5 -> .5 (but no 0.0 -> .0), only one of the groups is set per match
+    return FLOAT_LITERAL_PATTERN.sub(r'\1.\2', shader_content)
 
 # === Main === #
 
@@ -122,8 +136,7 @@ def process_shader(filepath):
 
     shader_content = process_includes(shader_content, filepath.parent)
     shader_content = remove_comments(shader_content)
-    shader_content = remove_newlines(shader_content)
-    shader_content = normalize_spaces(shader_content)
+    shader_content = compact_lines(shader_content)
     shader_content = optimize_float_literals(shader_content)
 
     return shader_content
@@ -157,7 +170,7 @@ def main():
             with open(args.output_file, mode, encoding=None if args.compress else 'utf-8') as f:
                 f.write(formatted_shader)
         else:
-            print(formatted_shader, end="")
+            sys.stdout.write(formatted_shader)
     except OSError as e:
         sys.exit(f"Error writing to output: {e}")
 